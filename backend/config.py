@@ -26,19 +26,28 @@ FINAL_SYSTEM_PROMPT = (
 DEFAULT_MAX_TOKENS: int = 1024
 DEFAULT_TEMPERATURE: float = 0.7
 
+# Threads that run the sync endpoints (AnyIO's default is 40). Agent queries
+# hold a thread for the full LLM round trip, so keep this above CPU count.
+THREADPOOL_SIZE: int = int(os.getenv("THREADPOOL_SIZE", "40"))
+# Threads shared by endpoints that fan out Pixeltable queries (file listing,
+# file details, search). Defaults to THREADPOOL_SIZE so fan-out doesn't cap
+# how many requests can query at once.
+QUERY_POOL_SIZE: int = int(os.getenv("QUERY_POOL_SIZE", str(THREADPOOL_SIZE)))
+
 # File upload
 UPLOAD_FOLDER = "data"
-ALLOWED_EXTENSIONS = {
+ALLOWED_EXTENSIONS = frozenset({
     "pdf", "txt", "md",
     "jpg", "jpeg", "png", "gif", "webp",
     "mp4", "mov", "avi",
-}
+})
+# Same set as Path.suffix returns it, so uploads can be checked without lstrip
+ALLOWED_EXT_WITH_DOT = frozenset(f".{ext}" for ext in ALLOWED_EXTENSIONS)
 
 # CORS
-CORS_ORIGINS: list[str] = [
+CORS_ORIGINS: list[str] = list(filter(None, (
     origin.strip()
     for origin in os.getenv(
         "CORS_ORIGINS", "http://localhost:5173,http://127.0.0.1:5173"
     ).split(",")
-    if origin.strip()
-]
+)))
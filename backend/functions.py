@@ -1,16 +1,32 @@
 """User-Defined Functions (UDFs) for the Pixeltable App Template."""
+import json
 import os
+from functools import lru_cache
 from typing import Any
 
 import pixeltable as pxt
 
+try:
+    from duckduckgo_search import DDGS
+except ImportError:
+    DDGS = None
+
+# Constant part of an Anthropic image content block; copied per image.
+_IMAGE_SOURCE = {"type": "base64", "media_type": "image/png"}
+
+
+@lru_cache(maxsize=1024)
+def _basename(path: str) -> str:
+    """Memoized os.path.basename; agent turns tend to cite the same few sources."""
+    return os.path.basename(path)
+
 
 @pxt.udf
 def web_search(keywords: str, max_results: int = 5) -> str:
     """Search the web using DuckDuckGo (no API key required)."""
+    if DDGS is None:
+        return "Search failed: duckduckgo-search is not installed."
     try:
-        from duckduckgo_search import DDGS
-
         with DDGS() as ddgs:
             results = list(
                 ddgs.news(
@@ -24,19 +40,32 @@ def web_search(keywords: str, max_results: int = 5) -> str:
             if not results:
                 return "No results found."
 
-            formatted = []
+            parts: list[str] = []
             for i, r in enumerate(results, 1):
-                formatted.append(
-                    f"{i}. {r.get('title', 'N/A')}\n"
-                    f"   Source: {r.get('source', 'N/A')}\n"
-                    f"   URL: {r.get('url', 'N/A')}\n"
-                    f"   {r.get('body', 'N/A')}\n"
-                )
-            return "\n".join(formatted)
+                get = r.get
+                if i > 1:
+                    parts.append("\n")
+                parts.extend((
+                    str(i), ". ", get("title", "N/A"),
+                    "\n   Source: ", get("source", "N/A"),
+                    "\n   URL: ", get("url", "N/A"),
+                    "\n   ", get("body", "N/A"), "\n",
+                ))
+            return "".join(parts)
     except Exception as e:
         return f"Search failed: {str(e)}."
 
 
+def _format_context(question: str, tool_str: str, doc_str: str, chat_str: str) -> str:
+    """Lay out the question and each context section as the LLM prompt sees them."""
+    return "".join((
+        "ORIGINAL QUESTION:\n", question,
+        "\n\nAVAILABLE CONTEXT:\n\n[TOOL RESULTS]\n", tool_str,
+        "\n\n[DOCUMENT CONTEXT]\n", doc_str,
+        "\n\n[CHAT HISTORY CONTEXT]\n", chat_str,
+    )).strip()
+
+
 @pxt.udf
 def assemble_context(
     question: str,
@@ -49,15 +78,15 @@ def assemble_context(
     if doc_context:
         items = []
         for item in doc_context:
-            text = item.get("text", "") if isinstance(item, dict) else str(item)
-            source = (
-                item.get("source_doc", "Unknown")
-                if isinstance(item, dict)
-                else "Unknown"
-            )
-            source_name = os.path.basename(str(source))
+            if isinstance(item, dict):
+                get = item.get
+                text = get("text", "")
+                source = get("source_doc", "Unknown")
+            else:
+                text, source = str(item), "Unknown"
             if text:
-                items.append(f"- [Source: {source_name}] {text}")
+                source_name = _basename(source if isinstance(source, str) else str(source))
+                items.append("".join(("- [Source: ", source_name, "] ", text)))
         if items:
             doc_context_str = "\n".join(items)
 
@@ -65,27 +94,38 @@ def assemble_context(
     if chat_memory_context:
         chat_items = []
         for item in chat_memory_context:
-            content = item.get("content", "")
-            role = item.get("role", "unknown")
+            get = item.get
+            content = get("content", "")
+            role = get("role", "unknown")
             chat_items.append(f"- [{role}] {content[:150]}")
         if chat_items:
             chat_str = "\n".join(chat_items)
 
-    tool_str = str(tool_outputs) if tool_outputs else "N/A"
-
-    return f"""ORIGINAL QUESTION:
-{question}
-
-AVAILABLE CONTEXT:
-
-[TOOL RESULTS]
-{tool_str}
-
-[DOCUMENT CONTEXT]
-{doc_context_str}
-
-[CHAT HISTORY CONTEXT]
-{chat_str}""".strip()
+    tool_str = (
+        json.dumps(tool_outputs, ensure_ascii=False, default=str)
+        if tool_outputs
+        else "N/A"
+    )
+
+    return _format_context(question, tool_str, doc_context_str, chat_str)
+
+
+def _append_images(
+    items: list[dict[str, Any]] | None, key: str, out: list[dict[str, Any]]
+) -> None:
+    """Append an image content block to `out` for each base64 payload under `key`."""
+    if not items:
+        return
+    for item in items:
+        if isinstance(item, dict) and key in item:
+            data = item[key]
+            if isinstance(data, bytes):
+                data = data.decode("ascii")
+            elif not isinstance(data, str):
+                continue
+            source = _IMAGE_SOURCE.copy()
+            source["data"] = data
+            out.append({"type": "image", "source": source})
 
 
 @pxt.udf
@@ -96,50 +136,20 @@ def assemble_final_messages(
     video_frame_context: list[dict[str, Any]] | None = None,
 ) -> list[dict[str, Any]]:
     """Build the final message list for the LLM, incorporating all context."""
-    msgs: list[dict[str, Any]] = []
-
-    if history_context:
-        for item in reversed(history_context):
-            role = item.get("role")
-            content = item.get("content")
-            if role and content:
-                msgs.append({"role": role, "content": content})
+    # History arrives newest-first from get_recent_chat_history
+    msgs: list[dict[str, Any]] = [
+        {"role": role, "content": content}
+        for role, content in (
+            (item.get("role"), item.get("content"))
+            for item in (history_context or ())[::-1]
+        )
+        if role and content
+    ]
 
     final_user_content: list[dict[str, Any]] = []
 
-    if image_context:
-        for item in image_context:
-            if isinstance(item, dict) and "encoded_image" in item:
-                data = item["encoded_image"]
-                if isinstance(data, bytes):
-                    data = data.decode("utf-8")
-                elif not isinstance(data, str):
-                    continue
-                final_user_content.append({
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": "image/png",
-                        "data": data,
-                    },
-                })
-
-    if video_frame_context:
-        for item in video_frame_context:
-            if isinstance(item, dict) and "encoded_frame" in item:
-                data = item["encoded_frame"]
-                if isinstance(data, bytes):
-                    data = data.decode("utf-8")
-                elif not isinstance(data, str):
-                    continue
-                final_user_content.append({
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": "image/png",
-                        "data": data,
-                    },
-                })
+    _append_images(image_context, "encoded_image", final_user_content)
+    _append_images(video_frame_context, "encoded_frame", final_user_content)
 
     final_user_content.append({"type": "text", "text": multimodal_context_text})
     msgs.append({"role": "user", "content": final_user_content})
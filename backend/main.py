@@ -1,15 +1,17 @@
 import logging
+import os
 from contextlib import asynccontextmanager
 from pathlib import Path
 
+from anyio import to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
-
-import pixeltable as pxt
+from fastapi.staticfiles import StaticFiles
 
 import config
-from routers import data, search, agent
+from models import HealthResponse
+from routers import data, search, agent, query_pool, warm_tables
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,8 +22,9 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    to_thread.current_default_thread_limiter().total_tokens = config.THREADPOOL_SIZE
     try:
-        pxt.get_table("app.agent")
+        warm_tables()
         logger.info("Connected to Pixeltable schema")
     except Exception:
         logger.warning(
@@ -30,6 +33,7 @@ async def lifespan(app: FastAPI):
             "The server will start but API calls will fail."
         )
     yield
+    query_pool.shutdown(cancel_futures=True)
 
 
 app = FastAPI(
@@ -52,26 +56,34 @@ app.include_router(search.router)
 app.include_router(agent.router)
 
 
-@app.get("/api/health")
+@app.get("/api/health", response_model=HealthResponse)
 def health():
     return {"status": "ok"}
 
 
-# Serve frontend static build (production)
+# Serve frontend static build (production). Checked once at import: the build
+# is expected to exist before the server starts.
 STATIC_DIR = Path(__file__).resolve().parent / "static"
+STATIC_BUILT = STATIC_DIR.is_dir()
+INDEX_HTML = STATIC_DIR / "index.html"
+_STATIC_ROOT = str(STATIC_DIR)
+
+# Hashed bundle assets go through StaticFiles (mounted before the catch-all so it wins)
+if (STATIC_DIR / "assets").is_dir():
+    app.mount("/assets", StaticFiles(directory=STATIC_DIR / "assets"), name="assets")
 
 
 @app.get("/{full_path:path}")
 def spa_fallback(full_path: str):
-    if not STATIC_DIR.is_dir():
+    if not STATIC_BUILT:
         return JSONResponse(
             {"detail": "Frontend not built. Run: cd frontend && npm run build"},
             status_code=404,
         )
-    file_path = STATIC_DIR / full_path
-    if file_path.is_file():
+    file_path = os.path.join(_STATIC_ROOT, full_path)
+    if os.path.isfile(file_path):
         return FileResponse(file_path)
-    return FileResponse(STATIC_DIR / "index.html")
+    return FileResponse(INDEX_HTML)
 
 
 if __name__ == "__main__":
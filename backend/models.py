@@ -26,6 +26,12 @@ class ChatHistoryRow(BaseModel):
     timestamp: datetime
 
 
+# ── App responses ────────────────────────────────────────────────────────────
+
+class HealthResponse(BaseModel):
+    status: str
+
+
 # ── Data endpoint responses ──────────────────────────────────────────────────
 
 class UploadResponse(BaseModel):
@@ -83,6 +89,13 @@ class TranscriptionResponse(BaseModel):
     full_text: str
 
 
+class FileDetailsResponse(BaseModel):
+    uuid: str
+    chunks: ChunksResponse | None = None
+    frames: FramesResponse | None = None
+    transcription: TranscriptionResponse | None = None
+
+
 # ── Agent conversation responses ─────────────────────────────────────────────
 
 class ConversationSummary(BaseModel):
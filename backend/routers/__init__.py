@@ -0,0 +1,63 @@
+"""API routers and the helpers they share."""
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import pixeltable as pxt
+
+import config
+
+# Every table and view defined by setup_pixeltable.py
+TABLE_NAMES = (
+    "documents", "chunks", "images", "videos", "video_frames",
+    "video_audio_chunks", "video_sentences", "chat_history", "agent",
+)
+
+# For endpoints that fan out independent Pixeltable queries (file listing,
+# file details, per-modality search); Pixeltable queries are thread-safe.
+query_pool = ThreadPoolExecutor(
+    max_workers=config.QUERY_POOL_SIZE, thread_name_prefix="pxt-query"
+)
+
+# Read caches key their entries on this counter, which every upload and delete
+# bumps. A query that started before a write still stores its result when it
+# finishes, but under the old generation, so it is never served again.
+_cache_generation = 0
+_cache_generation_lock = threading.Lock()
+_cache_clear_hooks: list[Callable[[], None]] = []
+
+
+def cache_generation() -> int:
+    return _cache_generation
+
+
+def read_cache(cached: Callable) -> Callable:
+    """Register an lru_cache'd read helper so writes free its entries."""
+    _cache_clear_hooks.append(cached.cache_clear)
+    return cached
+
+
+def bump_cache_generation() -> None:
+    """Invalidate every read cache; called after any upload or delete.
+
+    The caches are per process, so this assumes a single Uvicorn worker.
+    """
+    global _cache_generation
+    with _cache_generation_lock:
+        _cache_generation += 1
+    # Stale entries are already unreachable; clearing just frees their memory
+    for clear in _cache_clear_hooks:
+        clear()
+
+
+@lru_cache(maxsize=None)
+def get_table(path: str) -> pxt.Table:
+    """Cached pxt.get_table(); restart the server after re-running setup_pixeltable.py."""
+    return pxt.get_table(path)
+
+
+def warm_tables() -> None:
+    """Resolve every app table handle up front so the first request doesn't pay for it."""
+    for name in TABLE_NAMES:
+        get_table(f"{config.APP_NAMESPACE}.{name}")
@@ -1,10 +1,9 @@
 """Tool-calling agent: query endpoint + conversation management."""
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import pixeltable as pxt
 
 import config
 from models import (
@@ -15,6 +14,7 @@ from models import (
     ConversationDetail,
     DeleteResponse,
 )
+from routers import get_table
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/agent", tags=["agent"])
@@ -37,13 +37,38 @@ class QueryResponse(BaseModel):
     metadata: QueryMetadata
 
 
+def _save_chat_history(
+    conversation_id: str, question: str, answer: str, asked_at: datetime
+) -> None:
+    """Persist the exchange before responding; the UI re-reads history right after."""
+    rows = [ChatHistoryRow(
+        role="user",
+        content=question,
+        conversation_id=conversation_id,
+        timestamp=asked_at,
+    )]
+    if answer and not answer.startswith("Error:"):
+        rows.append(ChatHistoryRow(
+            role="assistant",
+            content=answer,
+            conversation_id=conversation_id,
+            # Offset keeps the reply ordered after the question without a second clock read
+            timestamp=asked_at + timedelta(microseconds=1),
+        ))
+    try:
+        chat_table = get_table(f"{config.APP_NAMESPACE}.chat_history")
+        chat_table.insert(rows)
+    except Exception as e:
+        logger.error(f"Error saving chat history: {e}")
+
+
 @router.post("/query", response_model=QueryResponse)
 def query(body: QueryRequest):
     if not body.query:
         raise HTTPException(status_code=400, detail="Query text is required")
 
     try:
-        agent_table = pxt.get_table(f"{config.APP_NAMESPACE}.agent")
+        agent_table = get_table(f"{config.APP_NAMESPACE}.agent")
 
         current_timestamp = datetime.now()
         row = ToolAgentRow(
@@ -68,28 +93,13 @@ def query(body: QueryRequest):
 
         data = result[0]
 
-        conversation_id = body.conversation_id or "default"
-        try:
-            chat_table = pxt.get_table(f"{config.APP_NAMESPACE}.chat_history")
-            chat_table.insert([ChatHistoryRow(
-                role="user",
-                content=body.query,
-                conversation_id=conversation_id,
-                timestamp=current_timestamp,
-            )])
-            answer = data.get("answer", "Error: No answer generated.")
-            if answer and not answer.startswith("Error:"):
-                chat_table.insert([ChatHistoryRow(
-                    role="assistant",
-                    content=answer,
-                    conversation_id=conversation_id,
-                    timestamp=datetime.now(),
-                )])
-        except Exception as e:
-            logger.error(f"Error saving chat history: {e}")
+        answer = data.get("answer", "Error: No answer generated.")
+        _save_chat_history(
+            body.conversation_id or "default", body.query, answer, current_timestamp
+        )
 
         return QueryResponse(
-            answer=data.get("answer", "Error: No answer generated."),
+            answer=answer,
             metadata=QueryMetadata(
                 timestamp=current_timestamp.isoformat(),
                 has_doc_context=bool(data.get("doc_context")),
@@ -107,10 +117,14 @@ def query(body: QueryRequest):
 
 # ── Conversations ─────────────────────────────────────────────────────────────
 
+def _iso(ts) -> str:
+    return ts.isoformat() if isinstance(ts, datetime) else str(ts)
+
+
 @router.get("/conversations", response_model=list[ConversationSummary])
 def list_conversations():
     try:
-        table = pxt.get_table(f"{config.APP_NAMESPACE}.chat_history")
+        table = get_table(f"{config.APP_NAMESPACE}.chat_history")
         rows = list(
             table.select(
                 role=table.role,
@@ -124,21 +138,20 @@ def list_conversations():
 
         convos: dict[str, dict] = {}
         for row in rows:
-            cid = row.get("conversation_id") or "default"
-            if cid not in convos:
-                ts = row["timestamp"]
-                ts_str = ts.isoformat() if isinstance(ts, datetime) else str(ts)
-                convos[cid] = {
+            cid = row["conversation_id"] or "default"
+            ts_str = _iso(row["timestamp"])
+            entry = convos.get(cid)
+            if entry is None:
+                entry = convos[cid] = {
                     "conversation_id": cid,
                     "title": "",
                     "created_at": ts_str,
                     "updated_at": ts_str,
                     "message_count": 0,
                 }
-            entry = convos[cid]
             entry["message_count"] += 1
-            ts = row["timestamp"]
-            entry["updated_at"] = ts.isoformat() if isinstance(ts, datetime) else str(ts)
+            # Rows arrive in timestamp order, so the last one seen is the latest
+            entry["updated_at"] = ts_str
             if not entry["title"] and row["role"] == "user":
                 entry["title"] = row["content"][:100]
 
@@ -151,7 +164,7 @@ def list_conversations():
 @router.get("/conversations/{conversation_id}", response_model=ConversationDetail)
 def get_conversation(conversation_id: str):
     try:
-        table = pxt.get_table(f"{config.APP_NAMESPACE}.chat_history")
+        table = get_table(f"{config.APP_NAMESPACE}.chat_history")
         rows = list(
             table.where(table.conversation_id == conversation_id)
             .select(role=table.role, content=table.content, timestamp=table.timestamp)
@@ -160,11 +173,10 @@ def get_conversation(conversation_id: str):
         )
         messages = []
         for row in rows:
-            ts = row["timestamp"]
             messages.append({
                 "role": row["role"],
                 "content": row["content"],
-                "timestamp": ts.isoformat() if isinstance(ts, datetime) else str(ts),
+                "timestamp": _iso(row["timestamp"]),
             })
         return {"conversation_id": conversation_id, "messages": messages}
     except Exception as e:
@@ -175,7 +187,7 @@ def get_conversation(conversation_id: str):
 @router.delete("/conversations/{conversation_id}", response_model=DeleteResponse)
 def delete_conversation(conversation_id: str):
     try:
-        table = pxt.get_table(f"{config.APP_NAMESPACE}.chat_history")
+        table = get_table(f"{config.APP_NAMESPACE}.chat_history")
         status = table.delete(where=(table.conversation_id == conversation_id))
         return {"message": "Deleted", "num_deleted": status.num_rows}
     except Exception as e:
@@ -1,18 +1,26 @@
 """Data pipeline endpoints: upload, list, delete, chunks, frames, transcription."""
+import base64
 import logging
 import os
 import shutil
+import sys
+import time
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
+from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
-import pixeltable as pxt
+from fastapi import APIRouter, HTTPException, Query, Response, UploadFile, File
 
 import config
 from models import (
     UploadResponse, FilesResponse, DeleteResponse,
     ChunkItem, ChunksResponse, FrameItem, FramesResponse, TranscriptionResponse,
+    FileDetailsResponse,
+)
+from routers import (
+    bump_cache_generation, cache_generation, get_table, query_pool, read_cache,
 )
 
 logger = logging.getLogger(__name__)
@@ -23,15 +31,34 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 
 IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 VIDEO_EXTS = {".mp4", ".mov", ".avi"}
+# Anything else that passes the upload allow-list is a document
+MEDIA_TYPE_BY_EXT = {
+    **dict.fromkeys(IMAGE_EXTS, "image"),
+    **dict.fromkeys(VIDEO_EXTS, "video"),
+}
 
-
-def _classify_file(filename: str) -> str:
-    ext = Path(filename).suffix.lower()
-    if ext in IMAGE_EXTS:
-        return "image"
-    if ext in VIDEO_EXTS:
-        return "video"
-    return "document"
+# 1 MiB copy buffer: media uploads are large, so fewer read/write syscalls
+COPY_BUFSIZE = 1 << 20
+# Only Linux sendfile(2) writes to regular files (macOS needs a socket), which
+# is also why shutil limits its own file-to-file sendfile to Linux
+USE_SENDFILE = sys.platform.startswith("linux")
+
+
+def _save_upload(file: UploadFile, dest: Path) -> None:
+    """Write an upload to `dest`; the file there is what Pixeltable references."""
+    with open(dest, "wb") as out:
+        # Starlette spools bodies over 1 MiB to a temp file, so those can be
+        # copied in-kernel; smaller ones are still in memory.
+        size = file.size or 0
+        if size > COPY_BUFSIZE and USE_SENDFILE:
+            src_fd, out_fd, offset = file.file.fileno(), out.fileno(), 0
+            while offset < size:
+                sent = os.sendfile(out_fd, src_fd, offset, size - offset)
+                if not sent:
+                    raise OSError(f"Upload truncated at {offset} of {size} bytes")
+                offset += sent
+        else:
+            shutil.copyfileobj(file.file, out, COPY_BUFSIZE)
 
 
 TABLE_PATHS = {
@@ -48,29 +75,30 @@ def upload_file(file: UploadFile = File(...)):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No filename")
 
-    ext = Path(file.filename).suffix.lower().lstrip(".")
-    if ext not in config.ALLOWED_EXTENSIONS:
-        raise HTTPException(status_code=400, detail=f"Unsupported file type: .{ext}")
+    ext = Path(file.filename).suffix.lower()
+    if ext not in config.ALLOWED_EXT_WITH_DOT:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {ext}")
 
-    ts = int(datetime.now().timestamp() * 1000)
-    safe_name = f"{ts}_{file.filename}"
+    # Nanosecond prefix keeps same-named uploads from overwriting each other
+    safe_name = f"{time.time_ns()}_{file.filename}"
     file_path = UPLOAD_DIR / safe_name
 
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    _save_upload(file, file_path)
 
-    media_type = _classify_file(file.filename)
-    table = pxt.get_table(TABLE_PATHS[media_type])
+    media_type = MEDIA_TYPE_BY_EXT.get(ext, "document")
+    table = get_table(TABLE_PATHS[media_type])
 
-    current_ts = datetime.now()
     table.insert([{
         media_type: str(file_path),
-        "timestamp": current_ts,
+        "filename": safe_name,
+        "timestamp": datetime.now(),
     }])
+    bump_cache_generation()
 
-    # Retrieve the auto-generated uuid7() primary key
+    # Retrieve the auto-generated uuid7() primary key; safe_name is unique per
+    # upload, unlike the timestamp, which concurrent uploads can share
     rows = list(
-        table.where(table.timestamp == current_ts)
+        table.where(table.filename == safe_name)
         .select(table.uuid)
         .limit(1)
         .collect()
@@ -87,134 +115,198 @@ def upload_file(file: UploadFile = File(...)):
 
 # ── List files ────────────────────────────────────────────────────────────────
 
-@router.get("/files", response_model=FilesResponse)
-def list_files():
-    result: dict = {"documents": [], "images": [], "videos": []}
+def _limited(query, limit: int | None, offset: int):
+    return query if limit is None else query.limit(limit, offset=offset)
 
-    try:
-        docs = pxt.get_table(TABLE_PATHS["document"])
-        result["documents"] = list(
-            docs.select(uuid=docs.uuid, name=docs.document, timestamp=docs.timestamp)
-            .order_by(docs.timestamp, asc=False)
-            .collect()
-        )
-        for d in result["documents"]:
-            d["uuid"] = str(d.get("uuid", ""))
-            d["name"] = os.path.basename(str(d.get("name", "")))
-            if isinstance(d.get("timestamp"), datetime):
-                d["timestamp"] = d["timestamp"].isoformat()
-    except Exception as e:
-        logger.warning(f"Could not list documents: {e}")
 
+def _list_media(media_type: str, limit: int | None, offset: int) -> list[dict]:
     try:
-        imgs = pxt.get_table(TABLE_PATHS["image"])
-        result["images"] = list(
-            imgs.select(
-                uuid=imgs.uuid,
-                name=imgs.image,
-                thumbnail=imgs.thumbnail,
-                timestamp=imgs.timestamp,
-            )
-            .order_by(imgs.timestamp, asc=False)
-            .collect()
-        )
-        for d in result["images"]:
-            raw = d.get("name")
-            d["uuid"] = str(d.get("uuid", ""))
-            d["name"] = os.path.basename(getattr(raw, "filename", "") or "")
-            if isinstance(d.get("timestamp"), datetime):
-                d["timestamp"] = d["timestamp"].isoformat()
+        table = get_table(TABLE_PATHS[media_type])
+        columns = {
+            "uuid": table.uuid,
+            "name": table.filename,
+            "timestamp": table.timestamp,
+        }
+        if media_type == "image":
+            columns["thumbnail"] = table.thumbnail
+        query = table.select(**columns).order_by(table.timestamp, asc=False)
+        rows = list(_limited(query, limit, offset).collect())
+        for d in rows:
+            d["uuid"] = str(d["uuid"])
+            ts = d["timestamp"]
+            if isinstance(ts, datetime):
+                d["timestamp"] = ts.isoformat()
+        return rows
     except Exception as e:
-        logger.warning(f"Could not list images: {e}")
+        logger.warning(f"Could not list {media_type}s: {e}")
+        return []
 
-    try:
-        vids = pxt.get_table(TABLE_PATHS["video"])
-        result["videos"] = list(
-            vids.select(uuid=vids.uuid, name=vids.video, timestamp=vids.timestamp)
-            .order_by(vids.timestamp, asc=False)
-            .collect()
-        )
-        for d in result["videos"]:
-            d["uuid"] = str(d.get("uuid", ""))
-            d["name"] = os.path.basename(str(d.get("name", "")))
-            if isinstance(d.get("timestamp"), datetime):
-                d["timestamp"] = d["timestamp"].isoformat()
-    except Exception as e:
-        logger.warning(f"Could not list videos: {e}")
 
-    return result
+@router.get("/files", response_model=FilesResponse)
+def list_files(
+    limit: Annotated[int | None, Query(ge=1)] = None,
+    offset: Annotated[int, Query(ge=0)] = 0,
+):
+    # The three tables are independent; query them concurrently.
+    # `limit`/`offset` (optional) page through each media type, newest first.
+    if offset and limit is None:
+        raise HTTPException(status_code=400, detail="offset requires limit")
+    futures = {
+        f"{media_type}s": query_pool.submit(_list_media, media_type, limit, offset)
+        for media_type in TABLE_PATHS
+    }
+    return {key: future.result() for key, future in futures.items()}
 
 
 # ── Delete ────────────────────────────────────────────────────────────────────
 
 @router.delete("/files/{file_uuid}/{file_type}", response_model=DeleteResponse)
-def delete_file(file_uuid: str, file_type: str):
+def delete_file(file_uuid: UUID, file_type: str):
     if file_type not in TABLE_PATHS:
         raise HTTPException(status_code=400, detail=f"Unknown type: {file_type}")
 
-    table = pxt.get_table(TABLE_PATHS[file_type])
-    status = table.delete(where=(table.uuid == UUID(file_uuid)))
+    table = get_table(TABLE_PATHS[file_type])
+    status = table.delete(where=(table.uuid == file_uuid))
+    bump_cache_generation()
     return {"message": "Deleted", "num_deleted": status.num_rows}
 
 
 # ── Document chunks ───────────────────────────────────────────────────────────
 
-@router.get("/chunks/{file_uuid}", response_model=ChunksResponse)
-def get_chunks(file_uuid: str):
+@read_cache
+@lru_cache(maxsize=256)
+def _chunks(file_uuid: UUID, generation: int) -> ChunksResponse:
     try:
-        chunks = pxt.get_table(f"{config.APP_NAMESPACE}.chunks")
+        chunks = get_table(f"{config.APP_NAMESPACE}.chunks")
         result = (
-            chunks.where(chunks.uuid == UUID(file_uuid))
+            chunks.where(chunks.uuid == file_uuid)
             .select(text=chunks.text, title=chunks.title, heading=chunks.heading, page=chunks.page)
             .collect()
         )
         items = list(result.to_pydantic(ChunkItem))
-        return ChunksResponse(uuid=file_uuid, chunks=items, total=len(items))
+        return ChunksResponse(uuid=str(file_uuid), chunks=items, total=len(items))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/chunks/{file_uuid}", response_model=ChunksResponse)
+def get_chunks(file_uuid: UUID):
+    return _chunks(file_uuid, cache_generation())
+
+
 # ── Video keyframes ───────────────────────────────────────────────────────────
 
+# Every frame is an inline base64 thumbnail, so cap how many one response holds
+# (and don't memoize these responses)
+MAX_FRAMES = 60
+
+
 @router.get("/frames/{file_uuid}", response_model=FramesResponse)
-def get_frames(file_uuid: str, limit: int = 12):
+def get_frames(file_uuid: UUID, limit: Annotated[int, Query(ge=1, le=MAX_FRAMES)] = 12):
     try:
-        frames_view = pxt.get_table(f"{config.APP_NAMESPACE}.video_frames")
+        frames_view = get_table(f"{config.APP_NAMESPACE}.video_frames")
         result = (
-            frames_view.where(frames_view.uuid == UUID(file_uuid))
+            frames_view.where(frames_view.uuid == file_uuid)
             .select(frame=frames_view.frame_thumbnail, position=frames_view.pos)
             .limit(limit)
             .collect()
         )
         items = list(result.to_pydantic(FrameItem))
-        return FramesResponse(uuid=file_uuid, frames=items, total=len(items))
+        return FramesResponse(uuid=str(file_uuid), frames=items, total=len(items))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # ── Video transcription ──────────────────────────────────────────────────────
 
-@router.get("/transcription/{file_uuid}", response_model=TranscriptionResponse)
-def get_transcription(file_uuid: str):
+@read_cache
+@lru_cache(maxsize=256)
+def _transcription(file_uuid: UUID, generation: int) -> dict:
     try:
-        sentences_view = pxt.get_table(f"{config.APP_NAMESPACE}.video_sentences")
-        rows = list(
-            sentences_view.where(sentences_view.uuid == UUID(file_uuid))
+        sentences_view = get_table(f"{config.APP_NAMESPACE}.video_sentences")
+        result = (
+            sentences_view.where(sentences_view.uuid == file_uuid)
             .select(text=sentences_view.text)
             .collect()
         )
-        # Deduplicate while preserving order
-        seen: set[str] = set()
-        texts: list[str] = []
-        for r in rows:
-            t = r.get("text", "")
-            if t and t not in seen:
-                seen.add(t)
-                texts.append(t)
+        # Read the column directly, deduplicating while preserving order
+        texts = list(dict.fromkeys(t for t in result["text"] if t))
         return {
-            "uuid": file_uuid,
+            "uuid": str(file_uuid),
             "sentences": texts,
             "full_text": " ".join(texts),
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/transcription/{file_uuid}", response_model=TranscriptionResponse)
+def get_transcription(file_uuid: UUID):
+    return _transcription(file_uuid, cache_generation())
+
+
+# ── Thumbnails ────────────────────────────────────────────────────────────────
+
+# Thumbnails are derived from immutable uploads keyed by a fresh uuid7
+THUMBNAIL_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+
+def _thumbnail_response(rows: list[dict]) -> Response:
+    if not rows or not rows[0]["thumbnail"]:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return Response(
+        content=base64.b64decode(rows[0]["thumbnail"]),
+        media_type="image/png",
+        headers=THUMBNAIL_HEADERS,
+    )
+
+
+@router.get("/thumbnail/image/{file_uuid}", response_class=Response)
+def get_image_thumbnail(file_uuid: UUID):
+    imgs = get_table(TABLE_PATHS["image"])
+    rows = list(
+        imgs.where(imgs.uuid == file_uuid)
+        .select(thumbnail=imgs.thumbnail)
+        .limit(1)
+        .collect()
+    )
+    return _thumbnail_response(rows)
+
+
+@router.get("/thumbnail/frame/{file_uuid}/{pos}", response_class=Response)
+def get_frame_thumbnail(file_uuid: UUID, pos: int):
+    frames_view = get_table(f"{config.APP_NAMESPACE}.video_frames")
+    rows = list(
+        frames_view.where((frames_view.uuid == file_uuid) & (frames_view.pos == pos))
+        .select(thumbnail=frames_view.frame_thumbnail)
+        .limit(1)
+        .collect()
+    )
+    return _thumbnail_response(rows)
+
+
+# ── Batched file details ─────────────────────────────────────────────────────
+
+DETAIL_PARTS = {
+    "document": {"chunks": get_chunks},
+    "video": {"frames": get_frames, "transcription": get_transcription},
+}
+
+
+@router.get("/details/{file_uuid}/{file_type}", response_model=FileDetailsResponse)
+def get_file_details(file_uuid: UUID, file_type: str):
+    if file_type not in TABLE_PATHS:
+        raise HTTPException(status_code=400, detail=f"Unknown type: {file_type}")
+
+    parts = DETAIL_PARTS.get(file_type, {})
+    futures = {
+        name: query_pool.submit(handler, file_uuid)
+        for name, handler in parts.items()
+    }
+    result: dict = {"uuid": str(file_uuid)}
+    for name, future in futures.items():
+        try:
+            result[name] = future.result()
+        except HTTPException as e:
+            logger.warning(f"Could not load {name} for {file_uuid}: {e.detail}")
+    return result
@@ -1,157 +1,214 @@
 """Cross-modal similarity search across all media types."""
+import heapq
 import logging
-import os
+from functools import lru_cache
+from operator import itemgetter
 
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-import pixeltable as pxt
+from pydantic import BaseModel, ConfigDict
 
 import config
 from models import SearchResponse
+from routers import cache_generation, get_table, query_pool, read_cache
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api", tags=["search"])
 
 
 class SearchRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     query: str
-    types: list[str] = ["document", "image", "video_frame", "transcript"]
+    types: frozenset[str] = frozenset(
+        {"document", "image", "video_frame", "transcript"}
+    )
     limit: int = 20
     threshold: float = 0.3
 
 
-@router.post("/search", response_model=SearchResponse)
-def search(body: SearchRequest):
+def _search_documents(query: str, limit: int, threshold: float) -> list[dict]:
     results: list[dict] = []
+    chunks = get_table(f"{config.APP_NAMESPACE}.chunks")
+    sim = chunks.text.similarity(query)
+    rows = list(
+        chunks.where(sim > threshold)
+        .order_by(sim, asc=False)
+        .select(
+            text=chunks.text,
+            uuid=chunks.uuid,
+            sim=sim,
+            title=chunks.title,
+            source=chunks.filename,
+        )
+        .limit(limit)
+        .collect()
+    )
+    for r in rows:
+        results.append({
+            "type": "document",
+            "uuid": str(r.get("uuid", "")),
+            "similarity": r.get("sim", 0),
+            "text": r.get("text", ""),
+            "metadata": {
+                "title": r.get("title"),
+                "source": r.get("source") or "",
+            },
+        })
+    return results
 
-    if "document" in body.types:
-        try:
-            chunks = pxt.get_table(f"{config.APP_NAMESPACE}.chunks")
-            sim = chunks.text.similarity(body.query)
-            rows = list(
-                chunks.where(sim > body.threshold)
-                .order_by(sim, asc=False)
-                .select(
-                    text=chunks.text,
-                    uuid=chunks.uuid,
-                    sim=sim,
-                    title=chunks.title,
-                    source=chunks.document,
-                )
-                .limit(body.limit)
-                .collect()
-            )
-            for r in rows:
-                results.append({
-                    "type": "document",
-                    "uuid": str(r.get("uuid", "")),
-                    "similarity": round(r.get("sim", 0), 3),
-                    "text": r.get("text", ""),
-                    "metadata": {
-                        "title": r.get("title"),
-                        "source": os.path.basename(str(r.get("source", ""))),
-                    },
-                })
-        except Exception as e:
-            logger.warning(f"Document search failed: {e}")
-
-    if "image" in body.types:
-        try:
-            imgs = pxt.get_table(f"{config.APP_NAMESPACE}.images")
-            sim = imgs.image.similarity(body.query)
-            rows = list(
-                imgs.where(sim > 0.2)
-                .order_by(sim, asc=False)
-                .select(
-                    uuid=imgs.uuid,
-                    sim=sim,
-                    thumbnail=imgs.thumbnail,
-                    name=imgs.image,
-                )
-                .limit(body.limit)
-                .collect()
-            )
-            for r in rows:
-                results.append({
-                    "type": "image",
-                    "uuid": str(r.get("uuid", "")),
-                    "similarity": round(r.get("sim", 0), 3),
-                    "thumbnail": r.get("thumbnail"),
-                    "metadata": {
-                        "source": os.path.basename(
-                            getattr(r.get("name"), "filename", "") or ""
-                        ),
-                    },
-                })
-        except Exception as e:
-            logger.warning(f"Image search failed: {e}")
-
-    if "video_frame" in body.types:
-        try:
-            frames = pxt.get_table(f"{config.APP_NAMESPACE}.video_frames")
-            sim = frames.frame.similarity(body.query)
-            rows = list(
-                frames.where(sim > 0.2)
-                .order_by(sim, asc=False)
-                .select(
-                    uuid=frames.uuid,
-                    sim=sim,
-                    thumbnail=frames.frame_thumbnail,
-                    source=frames.video,
-                )
-                .limit(body.limit)
-                .collect()
-            )
-            for r in rows:
-                results.append({
-                    "type": "video_frame",
-                    "uuid": str(r.get("uuid", "")),
-                    "similarity": round(r.get("sim", 0), 3),
-                    "thumbnail": r.get("thumbnail"),
-                    "metadata": {
-                        "source": os.path.basename(str(r.get("source", ""))),
-                    },
-                })
-        except Exception as e:
-            logger.warning(f"Video frame search failed: {e}")
-
-    if "transcript" in body.types:
+
+def _search_images(query: str, limit: int, threshold: float) -> list[dict]:
+    results: list[dict] = []
+    imgs = get_table(f"{config.APP_NAMESPACE}.images")
+    sim = imgs.image.similarity(query)
+    rows = list(
+        imgs.where(sim > 0.2)
+        .order_by(sim, asc=False)
+        .select(
+            uuid=imgs.uuid,
+            sim=sim,
+            source=imgs.filename,
+        )
+        .limit(limit)
+        .collect()
+    )
+    for r in rows:
+        file_uuid = str(r.get("uuid", ""))
+        results.append({
+            "type": "image",
+            "uuid": file_uuid,
+            "similarity": r.get("sim", 0),
+            "thumbnail": f"/api/data/thumbnail/image/{file_uuid}",
+            "metadata": {
+                "source": r.get("source") or "",
+            },
+        })
+    return results
+
+
+def _search_video_frames(query: str, limit: int, threshold: float) -> list[dict]:
+    results: list[dict] = []
+    frames = get_table(f"{config.APP_NAMESPACE}.video_frames")
+    sim = frames.frame.similarity(query)
+    rows = list(
+        frames.where(sim > 0.2)
+        .order_by(sim, asc=False)
+        .select(
+            uuid=frames.uuid,
+            pos=frames.pos,
+            sim=sim,
+            source=frames.filename,
+        )
+        .limit(limit)
+        .collect()
+    )
+    for r in rows:
+        file_uuid = str(r.get("uuid", ""))
+        results.append({
+            "type": "video_frame",
+            "uuid": file_uuid,
+            "similarity": r.get("sim", 0),
+            "thumbnail": f"/api/data/thumbnail/frame/{file_uuid}/{r['pos']}",
+            "metadata": {
+                "source": r.get("source") or "",
+            },
+        })
+    return results
+
+
+def _search_transcripts(query: str, limit: int, threshold: float) -> list[dict]:
+    results: list[dict] = []
+    sents = get_table(f"{config.APP_NAMESPACE}.video_sentences")
+    sim = sents.text.similarity(query)
+    rows = list(
+        sents.where(sim > threshold)
+        .order_by(sim, asc=False)
+        .select(
+            text=sents.text,
+            uuid=sents.uuid,
+            sim=sim,
+            source=sents.filename,
+        )
+        .limit(limit * 3)  # fetch extra to allow dedup
+        .collect()
+    )
+    # Rows come best-first, so stop once `limit` distinct texts are kept
+    seen_texts: set[str] = set()
+    for r in rows:
+        text = r.get("text", "")
+        if text in seen_texts:
+            continue
+        seen_texts.add(text)
+        if len(seen_texts) > limit:
+            break
+        results.append({
+            "type": "transcript",
+            "uuid": str(r.get("uuid", "")),
+            "similarity": r.get("sim", 0),
+            "text": text,
+            "metadata": {
+                "source": r.get("source") or "",
+            },
+        })
+    return results
+
+
+SEARCHERS = {
+    "document": _search_documents,
+    "image": _search_images,
+    "video_frame": _search_video_frames,
+    "transcript": _search_transcripts,
+}
+
+
+class _PartialResults(Exception):
+    """Raised when a search branch failed, so lru_cache doesn't store the result."""
+
+    def __init__(self, results: list[dict]):
+        super().__init__("search branch failed")
+        self.results = results
+
+
+@read_cache
+@lru_cache(maxsize=1024)
+def _cached_search(
+    query: str, types: frozenset[str], limit: int, threshold: float, generation: int
+) -> list[dict]:
+    # Each modality is an independent query; run them concurrently
+    futures = [
+        (media_type, query_pool.submit(searcher, query, limit, threshold))
+        for media_type, searcher in SEARCHERS.items()
+        if media_type in types
+    ]
+    results: list[dict] = []
+    failed = False
+    for media_type, future in futures:
         try:
-            sents = pxt.get_table(f"{config.APP_NAMESPACE}.video_sentences")
-            sim = sents.text.similarity(body.query)
-            rows = list(
-                sents.where(sim > body.threshold)
-                .order_by(sim, asc=False)
-                .select(
-                    text=sents.text,
-                    uuid=sents.uuid,
-                    sim=sim,
-                    source=sents.video,
-                )
-                .limit(body.limit * 3)  # fetch extra to allow dedup
-                .collect()
-            )
-            seen_texts: set[str] = set()
-            for r in rows:
-                text = r.get("text", "")
-                if text in seen_texts:
-                    continue
-                seen_texts.add(text)
-                results.append({
-                    "type": "transcript",
-                    "uuid": str(r.get("uuid", "")),
-                    "similarity": round(r.get("sim", 0), 3),
-                    "text": text,
-                    "metadata": {
-                        "source": os.path.basename(str(r.get("source", ""))),
-                    },
-                })
-        except Exception as e:
-            logger.warning(f"Transcript search failed: {e}")
-
-    results.sort(key=lambda x: x.get("similarity", 0), reverse=True)
+            results.extend(future.result())
+        except Exception:
+            failed = True
+            logger.warning("Search branch %s failed", media_type, exc_info=True)
+    top = heapq.nlargest(limit, results, key=itemgetter("similarity"))
+    # Round only the rows that are returned, not every candidate
+    for r in top:
+        r["similarity"] = round(r["similarity"], 3)
+    if failed:
+        raise _PartialResults(top)
+    return top
 
+
+@router.post("/search", response_model=SearchResponse)
+def search(body: SearchRequest):
+    # Repeated queries (retries, typeahead) are served from the cache, which
+    # data uploads and deletes invalidate; degraded results are not cached
+    try:
+        results = _cached_search(
+            body.query.strip(), body.types, body.limit, body.threshold,
+            cache_generation(),
+        )
+    except _PartialResults as e:
+        results = e.results
     return {
         "query": body.query,
-        "results": results[: body.limit],
+        "results": results,
     }
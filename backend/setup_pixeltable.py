@@ -30,6 +30,7 @@ documents = pxt.create_table(
     f"{config.APP_NAMESPACE}.documents",
     {
         "document": pxt.Document,
+        "filename": pxt.String,
         "uuid": uuid7(),
         "timestamp": pxt.Timestamp,
     },
@@ -48,11 +49,20 @@ chunks = pxt.create_view(
     if_exists="ignore",
 )
 
-sentence_embed = sentence_transformer.using(model_id=config.EMBEDDING_MODEL_ID)
+# Unit-norm embeddings let the indexes use inner product, which ranks and
+# scores identically to cosine without the per-row norm computation.
+sentence_embed = sentence_transformer.using(
+    model_id=config.EMBEDDING_MODEL_ID, normalize_embeddings=True
+)
 
+# Every index stores halfvec (fp16) vectors, half the size of fp32 ones. It is
+# Pixeltable's default, passed explicitly so a change to it can't silently
+# double index size.
 chunks.add_embedding_index(
     "text",
     string_embed=sentence_embed,
+    metric="ip",
+    precision="fp16",
     if_exists="ignore",
 )
 
@@ -83,6 +93,7 @@ images = pxt.create_table(
     f"{config.APP_NAMESPACE}.images",
     {
         "image": pxt.Image,
+        "filename": pxt.String,
         "uuid": uuid7(),
         "timestamp": pxt.Timestamp,
     },
@@ -98,6 +109,7 @@ images.add_computed_column(
 images.add_embedding_index(
     "image",
     embedding=clip.using(model_id=config.CLIP_MODEL_ID),
+    precision="fp16",
     if_exists="ignore",
 )
 
@@ -126,6 +138,7 @@ videos = pxt.create_table(
     f"{config.APP_NAMESPACE}.videos",
     {
         "video": pxt.Video,
+        "filename": pxt.String,
         "uuid": uuid7(),
         "timestamp": pxt.Timestamp,
     },
@@ -151,6 +164,7 @@ video_frames.add_computed_column(
 video_frames.add_embedding_index(
     column="frame",
     embedding=clip.using(model_id=config.CLIP_MODEL_ID),
+    precision="fp16",
     if_exists="ignore",
 )
 
@@ -202,7 +216,11 @@ video_sentences = pxt.create_view(
 )
 
 video_sentences.add_embedding_index(
-    column="text", string_embed=sentence_embed, if_exists="ignore"
+    column="text",
+    string_embed=sentence_embed,
+    metric="ip",
+    precision="fp16",
+    if_exists="ignore",
 )
 
 print("  Videos: audio extraction -> Whisper transcription -> sentence embedding")
@@ -238,7 +256,11 @@ chat_history = pxt.create_table(
 )
 
 chat_history.add_embedding_index(
-    column="content", string_embed=sentence_embed, if_exists="ignore"
+    column="content",
+    string_embed=sentence_embed,
+    metric="ip",
+    precision="fp16",
+    if_exists="ignore",
 )
 
 print("  Chat history: table + embedding index")
@@ -276,13 +276,13 @@ function VideoDetail({ uuid }: { uuid: string }) {
 
   useEffect(() => {
     setIsLoading(true)
-    Promise.all([
-      api.getFrames(uuid).catch(() => ({ frames: [] })),
-      api.getTranscription(uuid).catch(() => ({ full_text: '' })),
-    ]).then(([f, t]) => {
-      setFrames('frames' in f ? f.frames : [])
-      setTranscription('full_text' in t ? t.full_text : '')
-    }).finally(() => setIsLoading(false))
+    api.getFileDetails(uuid, 'video')
+      .then(d => {
+        setFrames(d.frames?.frames ?? [])
+        setTranscription(d.transcription?.full_text ?? '')
+      })
+      .catch(() => {})
+      .finally(() => setIsLoading(false))
   }, [uuid])
 
   if (isLoading) return <div className="text-sm text-muted-foreground">Loading video data...</div>
@@ -4,6 +4,7 @@ import type {
   ChunksResponse,
   FramesResponse,
   TranscriptionResponse,
+  FileDetailsResponse,
   SearchResponse,
   Conversation,
   ChatMessage,
@@ -56,6 +57,10 @@ export async function getTranscription(uuid: string): Promise<TranscriptionRespo
   return request<TranscriptionResponse>(`${BASE}/data/transcription/${uuid}`)
 }
 
+export async function getFileDetails(uuid: string, type: string): Promise<FileDetailsResponse> {
+  return request<FileDetailsResponse>(`${BASE}/data/details/${uuid}/${type}`)
+}
+
 // ── Search ───────────────────────────────────────────────────────────────────
 
 export async function search(params: {
@@ -5,9 +5,12 @@ export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs))
 }
 
-/** Wrap raw base64 from Pixeltable's b64_encode UDF into a data-URL for <img src>. */
+/**
+ * Wrap raw base64 from Pixeltable's b64_encode UDF into a data-URL for <img src>.
+ * Data-URLs and API paths (e.g. /api/data/thumbnail/...) pass through as-is.
+ */
 export function toDataUrl(b64: string | undefined, format = 'png'): string {
   if (!b64) return ''
-  if (b64.startsWith('data:')) return b64
+  if (b64.startsWith('data:') || b64.startsWith('/api/')) return b64
   return `data:image/${format};base64,${b64}`
 }
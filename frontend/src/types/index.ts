@@ -68,6 +68,13 @@ export interface TranscriptionResponse {
   full_text: string
 }
 
+export interface FileDetailsResponse {
+  uuid: string
+  chunks?: ChunksResponse | null
+  frames?: FramesResponse | null
+  transcription?: TranscriptionResponse | null
+}
+
 export interface SearchResult {
   type: 'document' | 'image' | 'video_frame' | 'transcript'
   uuid: string